@@ -1,12 +1,32 @@
 import os
+import sys
+import asyncio
 import logging
-from io import BytesIO
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO, StringIO
+from pathlib import Path
 import re
 import html
+import hashlib
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from weasyprint import HTML
+from telegram.request import HTTPXRequest
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
+
+try:
+    import uvloop  # libuv event loop (មិនមានលើ Windows)
+except ImportError:
+    uvloop = None
+try:
+    import orjson  # JSON decoder លឿនជាង json ស្តង់ដារ
+except ImportError:
+    orjson = None
 
 # Logging
 logging.basicConfig(
@@ -19,42 +39,58 @@ TOKEN = os.getenv("BOT_TOKEN")
 if not TOKEN:
     raise RuntimeError("សូមកំណត់ BOT_TOKEN ជា environment variable មុនចាប់ផ្តើម។")
 
+# Webhook (optional) — បើកំណត់ WEBHOOK_URL នោះ Telegram នឹង push update មកដោយផ្ទាល់
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+PORT = int(os.getenv("PORT", "8443"))
+
+# Stylesheet — parse តែម្តងពេល import ហើយប្រើឡើងវិញគ្រប់ PDF
+PDF_CSS = """
+@page {
+    margin-left: 0.40in;
+    margin-right: 0.40in;
+    margin-top: 0.4in;
+    margin-bottom: 0.4in;
+}
+body {
+    font-family: 'Battambang', 'Noto Sans Khmer', 'Khmer OS', 'Arial', sans-serif;
+    font-size: 19px;
+    line-height: 2;
+    color: #222;
+    margin: 0;
+    padding: 0;
+    word-wrap: break-word;
+    overflow-wrap: break-word;
+    word-break: keep-all;
+}
+.content {
+    margin-bottom: 30px;
+}
+.footer {
+    color: #666;
+    font-size: 10px;
+    margin-top: 30px;
+    padding-top: 10px;
+    border-top: 1px solid #eee;
+}
+"""
+
+# Font Battambang នៅក្នុង repo (./font) — មិនចាំបាច់ទាញពី Google Fonts តាម network
+FONT_DIR = Path(__file__).resolve().parent / "font"
+FONT_FACE_CSS = "".join(
+    f"@font-face {{ font-family: 'Battambang'; font-weight: {weight}; "
+    f"src: url('{(FONT_DIR / filename).as_uri()}') format('truetype'); }}\n"
+    for weight, filename in ((400, "Battambang-Regular.ttf"), (700, "Battambang-Bold.ttf"))
+)
+
+FONT_CONFIG = FontConfiguration()
+PDF_STYLESHEET = CSS(string=FONT_FACE_CSS + PDF_CSS, font_config=FONT_CONFIG)
+
 # HTML Template
 HTML_TEMPLATE = """<!DOCTYPE html>
 <html lang="km">
 <head>
     <meta charset="utf-8">
     <title>PDF Khmer by TENG SAMBATH</title>
-    <style>
-        @page {{
-            margin-left: 0.40in;
-            margin-right: 0.40in;
-            margin-top: 0.4in;
-            margin-bottom: 0.4in;
-        }}
-        body {{
-            font-family: 'Battambang', 'Noto Sans Khmer', 'Khmer OS', 'Arial', sans-serif;
-            font-size: 19px;
-            line-height: 2;
-            color: #222;
-            margin: 0;
-            padding: 0;
-            word-wrap: break-word;
-            overflow-wrap: break-word;
-            word-break: keep-all;
-        }}
-        .content {{
-            margin-bottom: 30px;
-        }}
-        .footer {{
-            color: #666;
-            font-size: 10px;
-            margin-top: 30px;
-            padding-top: 10px;
-            border-top: 1px solid #eee;
-        }}
-    </style>
-    <link href="https://fonts.googleapis.com/css2?family=Battambang:wght@400;700&family=Noto+Sans+Khmer:wght@400;700&display=swap" rel="stylesheet">
 </head>
 <body>
     <div class="content">
@@ -65,90 +101,355 @@ Bot Text2PDF | Teng Sambath
     </div>
 </body>
 </html>"""
+# បំបែក template តែម្តង ដើម្បីកុំ parse str.format រាល់ PDF
+HTML_PREFIX, HTML_SUFFIX = HTML_TEMPLATE.split("{content}")
+
+# Messages
+START_MESSAGE = (
+    "🇰🇭 BOT បំលែងអត្ថបទទៅជា PDF 🇰🇭 \n\n"
+    "📝 សូមផ្ញើអត្ថបទជាផ្នែកៗ (Chunks)\n"
+    "➡️ ពេលចប់ សូមវាយ /done ដើម្បីបង្កើត PDF"
+)
+SAVED_MESSAGE = "📌 អត្ថបទ {count} ផ្នែកបានរក្សាទុក! បន្តផ្ញើឬវាយ /done ដើម្បីបញ្ចប់។"
+TOO_LONG_MESSAGE = "⚠️ អត្ថបទវែងពេក! សូមវាយ /done ដើម្បីបង្កើត PDF សិន។"
+EMPTY_MESSAGE = "❌ មិនមានអត្ថបទ! សូមផ្ញើអត្ថបទជាមុនសិន។"
+WAIT_MESSAGE = "⏳ សូមរង់ចាំ... កំពុងបង្កើត PDF"
+DONE_CAPTION = "✅ **សូមអបអរ! PDF រួចរាល់**"
+ERROR_MESSAGE = "❌ មានបញ្ហាធ្ងន់ធ្ងរកើតឡើង៖ {error}"
+DROPPED_MESSAGE = "⚠️ អត្ថបទដែលផ្ញើពេលកំពុងបង្កើត PDF វែងពេក ហើយមិនត្រូវបានរក្សាទុកទេ។ សូមវាយ /done ម្តងទៀត។"
 
 # Application
-# <--- ការកែប្រែទី១៖ បន្ថែម read_timeout និង connect_timeout ដើម្បីការពារការផ្តាច់ (Timeout)
-app = Application.builder().token(TOKEN).read_timeout(30).connect_timeout(30).build()
+# HTTP/2 ដឹក API call ច្រើនស្របគ្នាលើ TLS connection តែមួយទៅ api.telegram.org;
+# connection បន្ថែមខ្លះ សម្រាប់ពេល server ឆ្លើយជា HTTP/1.1 (មួយ call ក្នុងមួយ connection)
+API_POOL_SIZE = 8
+
+class OrjsonRequest(HTTPXRequest):
+    """HTTPXRequest that decodes Bot API responses with orjson."""
+
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> dict:
+        try:
+            return orjson.loads(payload)
+        except ValueError as exc:
+            raise TelegramError("Invalid server response") from exc
+
+def build_request(pool_size: int) -> HTTPXRequest:
+    """HTTP client for Bot API calls; connections stay open and are reused between calls."""
+    request_class = OrjsonRequest if orjson else HTTPXRequest
+    # <--- ការកែប្រែទី១៖ បន្ថែម read_timeout និង connect_timeout ដើម្បីការពារការផ្តាច់ (Timeout)
+    return request_class(
+        connection_pool_size=pool_size,
+        read_timeout=30,
+        connect_timeout=30,
+        write_timeout=60,  # upload PDF ធំ
+        pool_timeout=10,
+        http_version="2",
+    )
+
+# concurrent_updates: PDF របស់ user ម្នាក់មិនរារាំង update របស់អ្នកដទៃ
+app = (
+    Application.builder()
+    .token(TOKEN)
+    .request(build_request(API_POOL_SIZE))
+    .get_updates_request(build_request(1))  # getUpdates មួយប៉ុណ្ណោះក្នុងពេលតែមួយ
+    .concurrent_updates(True)
+    .build()
+)
+
+# Memory buffer per user — ទុកតែអ្នកប្រើ MAX_USERS នាក់ចុងក្រោយ ដើម្បីកុំឱ្យ RAM កើនឥតឈប់
+MAX_USERS = 10_000
+# អត្ថបទច្រើនបំផុតក្នុងមួយ PDF (ការពារកុំឱ្យ render មួយគាំង worker យូរពេក)
+MAX_TEXT_CHARS = 500_000
+# session ដែលគ្មានសារថ្មី 30 នាទី នឹងត្រូវលុប (ពិនិត្យរៀងរាល់ 10 នាទី)
+SESSION_IDLE_SECONDS = 30 * 60
+SESSION_SWEEP_SECONDS = 10 * 60
+# ឆ្លើយ "បានរក្សាទុក" តែម្តង ក្រោយអ្នកប្រើឈប់ផ្ញើ ACK_QUIET_SECONDS (កាត់បន្ថយ API call)
+ACK_QUIET_SECONDS = 0.5
+
+class UserSession:
+    """Per-user state: escaped text buffer, last write time and chunks not yet acknowledged.
+
+    ``lock`` serialises /start and /done for one user while other users run concurrently.
+    """
+
+    __slots__ = ("buffer", "last_write", "unacked", "lock")
+
+    def __init__(self):
+        self.buffer = StringIO()
+        self.last_write = time.monotonic()
+        self.unacked = 0
+        self.lock = asyncio.Lock()
+
+class UserStore(OrderedDict):
+    """``user_id -> UserSession`` mapping that evicts the least recently written user when full."""
+
+    def __init__(self, max_users: int):
+        super().__init__()
+        self.max_users = max_users
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.touch(key)
+        if len(self) > self.max_users:
+            self._evict_oldest()
+
+    def touch(self, key) -> None:
+        """Mark ``key`` as just written (moves it to the most-recent end)."""
+        self.move_to_end(key)
+        self[key].last_write = time.monotonic()
+
+    def evict_idle(self, max_idle: float) -> int:
+        """Drop users with no write for ``max_idle`` seconds and return how many were dropped."""
+        cutoff = time.monotonic() - max_idle
+        evicted = 0
+        while self and next(iter(self.values())).last_write < cutoff:
+            self._evict_oldest()
+            evicted += 1
+        return evicted
+
+    def _evict_oldest(self) -> None:
+        self.popitem(last=False)
+
+user_data_store = UserStore(MAX_USERS)
+
+# Cache PDF តាម hash នៃ HTML — អត្ថបទដដែល /done ម្តងទៀត មិនចាំបាច់ render ថ្មី
+PDF_CACHE_MAX_BYTES = 16 * 1024 * 1024
+PDF_CACHE_MAX_ITEM_BYTES = 2 * 1024 * 1024
+
+class PdfCache(OrderedDict):
+    """``HTML digest -> PDF bytes`` LRU cache bounded by the total size of the cached PDFs."""
+
+    def __init__(self, max_bytes: int, max_item_bytes: int):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.total_bytes = 0
+
+    def lookup(self, key: bytes):
+        pdf = self.get(key)
+        if pdf is not None:
+            self.move_to_end(key)
+        return pdf
 
-# Memory buffer per user
-user_data_store = {}
+    def store(self, key: bytes, pdf: bytes) -> None:
+        if len(pdf) > self.max_item_bytes or key in self:
+            return
+        self[key] = pdf
+        self.total_bytes += len(pdf)
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+pdf_cache = PdfCache(PDF_CACHE_MAX_BYTES, PDF_CACHE_MAX_ITEM_BYTES)
+
+# render thread នីមួយៗមាន FontConfiguration + CSS ផ្ទាល់ខ្លួន (Pango font map មិន thread-safe)
+_render_local = threading.local()
+
+def render_pdf(html_string: str) -> bytes:
+    """Render HTML to PDF bytes. Runs inside a worker of ``_pdf_pool``."""
+    font_config = getattr(_render_local, "font_config", FONT_CONFIG)
+    stylesheet = getattr(_render_local, "stylesheet", PDF_STYLESHEET)
+    buf = BytesIO()
+    HTML(string=html_string).write_pdf(
+        buf, stylesheets=[stylesheet], font_config=font_config
+    )
+    return buf.getvalue()
+
+# Marker ទាំង ៤ ប្រភេទ compile តែម្តង ហើយ scan អត្ថបទតែមួយដង
+MARKER_PATTERN = re.compile(r"^(\s*)([A-Z]|[ក-ឳ]|[0-9]+|[១-៩]+)\.", re.MULTILINE)
+HIGHLIGHT_OPEN = '<span style="background-color: yellow;">'
 
 def format_text_for_pdf(text: str) -> str: # <--- ប្តូរឈ្មោះ Function ឱ្យកាន់តែច្បាស់
     """
     បន្ថែម <br> ចុះបន្ទាត់ និង Highlight ពណ៌លឿងនៅពីមុខ Marker
     A. B. ... / ក. ខ. ... / 1. 2. ... / ១. ២. ...
     """
-    # <--- ការកែប្រែទី២៖ បន្ថែម <span> សម្រាប់ Highlight ពណ៌លឿង
-    highlight_style = 'style="background-color: yellow;"'
-    
-    patterns = [
-        (r"(?m)^(\s*)([A-Z])\.", rf'<br>\1<span {highlight_style}>\2.</span>'),       # A. B. ...
-        (r"(?m)^(\s*)([ក-ឳ])\.", rf'<br>\1<span {highlight_style}>\2.</span>'),      # ក. ខ. ...
-        (r"(?m)^(\s*)([0-9]+)\.", rf'<br>\1<span {highlight_style}>\2.</span>'),      # 1. 2. ...
-        (r"(?m)^(\s*)([១-៩]+)\.", rf'<br>\1<span {highlight_style}>\2.</span>')       # ១. ២. ...
-    ]
-    
-    for pattern, replacement in patterns:
-        text = re.sub(pattern, replacement, text)
-        
-    return text
+    # finditer + join លឿនជាង re.sub ដែលមាន backreference (\1, \2) ក្នុង replacement
+    parts = []
+    last = 0
+    for match in MARKER_PATTERN.finditer(text):
+        indent, marker = match.groups()
+        parts += (text[last:match.start()], "<br>", indent, HIGHLIGHT_OPEN, marker, ".</span>")
+        last = match.end()
+    parts.append(text[last:])
+    return "".join(parts)
+
+@lru_cache(maxsize=1)
+def filename_timestamp(second: int) -> str:
+    """``YYYYmmdd_HHMMSS`` for a Unix second; cached so a burst of PDFs formats it once."""
+    return time.strftime("%Y%m%d_%H%M%S", time.localtime(second))
+
+def warm_up_renderer() -> None:
+    """Render a throwaway Khmer PDF so fontconfig/Pango caches are hot before the first /done."""
+    sample = format_text_for_pdf("ក. កខគឃង ABC abc 0123 ០១២៣")
+    render_pdf(HTML_PREFIX + sample + HTML_SUFFIX)
+
+def init_render_thread() -> None:
+    """Give a render thread its own font map and stylesheet, then warm them up."""
+    _render_local.font_config = FontConfiguration()
+    _render_local.stylesheet = CSS(string=FONT_FACE_CSS + PDF_CSS, font_config=_render_local.font_config)
+    warm_up_renderer()
+
+# WeasyPrint ស៊ី CPU ខ្លាំង → បង្កើត PDF ក្នុង process ផ្សេង ដើម្បីកុំឱ្យ event loop គាំង
+# worker នីមួយៗ warm-up font ខ្លួនឯងពេលចាប់ផ្តើម
+# os.cpu_count() រាប់ CPU របស់ម៉ាស៊ីន មិនមែន limit របស់ container ទេ → កំណត់បានតាម env PDF_WORKERS
+PDF_WORKERS = int(os.getenv("PDF_WORKERS") or max(2, (os.cpu_count() or 1) - 1))
+# Python free-threaded (3.13t) ដែល GIL បិទមែន: thread render ស្របគ្នាបាន មិនចាំបាច់ចំណាយលើ process/pickle
+GIL_DISABLED = hasattr(sys, "_is_gil_enabled") and not sys._is_gil_enabled()
+
+def new_pdf_pool():
+    """Create the render executor: threads on free-threaded builds, processes otherwise."""
+    if GIL_DISABLED:
+        return ThreadPoolExecutor(
+            max_workers=PDF_WORKERS, thread_name_prefix="pdf", initializer=init_render_thread
+        )
+    return ProcessPoolExecutor(max_workers=PDF_WORKERS, initializer=warm_up_renderer)
+
+_pdf_pool = new_pdf_pool()
+# កំណត់ចំនួន render ក្នុងពេលតែមួយ (worker នីមួយៗមាន job មួយកំពុងធ្វើ + មួយរង់ចាំ)
+_render_semaphore = asyncio.Semaphore(2 * PDF_WORKERS)
+
+async def run_render(html_string: str) -> bytes:
+    """Render in ``_pdf_pool``; if a dead worker broke the pool, rebuild it and retry once."""
+    global _pdf_pool
+    loop = asyncio.get_running_loop()
+    pool = _pdf_pool
+    try:
+        return await loop.run_in_executor(pool, render_pdf, html_string)
+    except BrokenExecutor:
+        # worker ស្លាប់ (OOM-kill, segfault, initializer បរាជ័យ) → pool ខូចជារៀងរហូត បើមិនបង្កើតថ្មី
+        if _pdf_pool is pool:  # render ច្រើនបរាជ័យព្រមគ្នា: បង្កើតថ្មីតែម្តង
+            logger.warning("PDF worker pool is broken; starting a new one")
+            pool.shutdown(wait=False, cancel_futures=True)
+            _pdf_pool = new_pdf_pool()
+        return await loop.run_in_executor(_pdf_pool, render_pdf, html_string)
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    user_data_store[user_id] = []  # reset
-    await update.message.reply_text(
-        "🇰🇭 BOT បំលែងអត្ថបទទៅជា PDF 🇰🇭 \n\n"
-        "📝 សូមផ្ញើអត្ថបទជាផ្នែកៗ (Chunks)\n"
-        "➡️ ពេលចប់ សូមវាយ /done ដើម្បីបង្កើត PDF"
+    session = user_data_store.get(user_id)
+    if session is None:
+        user_data_store[user_id] = UserSession()
+    else:
+        # រង់ចាំ /done ដែលកំពុង render ចប់សិន ដើម្បីកុំឱ្យវាដាក់អត្ថបទចាស់ត្រឡប់វិញក្រោយ reset
+        async with session.lock:
+            session.buffer = StringIO()  # reset
+            session.unacked = 0  # កុំឱ្យ flush_ack ចាស់ឆ្លើយ "បានរក្សាទុក" សម្រាប់អត្ថបទដែលទើបលុប
+            user_data_store.touch(user_id)
+    await update.message.reply_text(START_MESSAGE)
+
+async def flush_ack(chat_id: int, session: UserSession, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send one "saved" reply once the user has stopped sending for ACK_QUIET_SECONDS."""
+    while True:
+        if not session.unacked:  # /done មកដល់មុន
+            return
+        wait = session.last_write + ACK_QUIET_SECONDS - time.monotonic()
+        if wait <= 0:
+            break
+        await asyncio.sleep(wait)
+    count, session.unacked = session.unacked, 0
+    await context.bot.send_message(
+        chat_id=chat_id,
+        text=SAVED_MESSAGE.format(count=count),
     )
 
 async def receive_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     text = update.message.text.strip()
 
-    if user_id not in user_data_store:
-        user_data_store[user_id] = []
-
     if not text.startswith("/"):
-        user_data_store[user_id].append(text)
-        await update.message.reply_text("📌 អត្ថបទបានរក្សាទុក! បន្តផ្ញើឬវាយ /done ដើម្បីបញ្ចប់។")
+        # escape + ប្តូរ \n ទៅ <br> ពេលទទួល ហើយសរសេរបន្តក្នុង buffer តែមួយ (មិនចាំបាច់ join ពេល /done)
+        session = user_data_store.get(user_id)
+        if session is None:
+            user_data_store[user_id] = session = UserSession()
+        buffer = session.buffer
+        escaped = html.escape(text, quote=False).replace("\n", "<br>\n")
+        separator = "<br>\n" if buffer.tell() else ""
+        # រាប់ separator ផង ដូចពេលដាក់អត្ថបទត្រឡប់វិញក្នុង done_command
+        if buffer.tell() + len(separator) + len(escaped) > MAX_TEXT_CHARS:
+            await update.message.reply_text(TOO_LONG_MESSAGE)
+            return
+        buffer.write(separator)
+        buffer.write(escaped)
+        user_data_store.touch(user_id)
+
+        session.unacked += 1
+        if session.unacked == 1:
+            context.application.create_task(
+                flush_ack(update.effective_chat.id, session, context), update=update
+            )
 
 async def done_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    if user_id not in user_data_store or not user_data_store[user_id]:
-        await update.message.reply_text("❌ មិនមានអត្ថបទ! សូមផ្ញើអត្ថបទជាមុនសិន។")
+    session = user_data_store.get(user_id)
+    if session is None:
+        await update.message.reply_text(EMPTY_MESSAGE)
         return
 
-    await update.message.reply_text("⏳ សូមរង់ចាំ... កំពុងបង្កើត PDF")
+    # /done និង /start របស់អ្នកប្រើម្នាក់ដំណើរការម្តងមួយ តាមលំដាប់ (អ្នកប្រើផ្សេងនៅតែស្របគ្នា)
+    async with session.lock:
+        if not session.buffer.tell():
+            await update.message.reply_text(EMPTY_MESSAGE)
+            return
 
-    try:
-        full_text = "\n".join(user_data_store[user_id])
-        escaped_text = html.escape(full_text)
-        
-        # ហៅ Function ដែលបានកែប្រែរួច
-        formatted_with_markers = format_text_for_pdf(escaped_text)
-        
-        html_content = formatted_with_markers.replace('\n', '<br>\n')
-        final_html = HTML_TEMPLATE.format(content=html_content)
-
-        pdf_buffer = BytesIO()
-        HTML(string=final_html).write_pdf(pdf_buffer)
-        pdf_buffer.seek(0)
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"KHMER_PDF_{timestamp}.pdf"
-
-        await context.bot.send_document(
-            chat_id=update.effective_chat.id,
-            document=pdf_buffer,
-            filename=filename,
-            caption="✅ **សូមអបអរ! PDF រួចរាល់**"
-        )
-        user_data_store[user_id] = []
+        # យក buffer ចេញមុន render: សារដែលមកពេលកំពុង render ចូល buffer ថ្មី
+        buffer, session.buffer = session.buffer, StringIO()
+        session.unacked = 0  # មិនចាំបាច់ ACK ទៀតទេ
+        user_data_store.touch(user_id)  # កុំឱ្យ session ត្រូវលុបចោល (idle) ពេលកំពុង render
+
+        try:
+            # សារស្ថានភាព មិនចាំបាច់ភ្ជាប់ reply ទៅសាររបស់អ្នកប្រើទេ
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text=WAIT_MESSAGE,
+                disable_notification=True,
+            )
+
+            # ហៅ Function ដែលបានកែប្រែរួច (buffer មាន <br> រួចហើយ)
+            html_content = format_text_for_pdf(buffer.getvalue())
+            final_html = HTML_PREFIX + html_content + HTML_SUFFIX
 
-    except Exception as e:
-        logger.error(f"Error creating PDF for user {user_id}: {e}", exc_info=True)
-        await update.message.reply_text(f"❌ មានបញ្ហាធ្ងន់ធ្ងរកើតឡើង៖ {str(e)}")
+            cache_key = hashlib.blake2b(final_html.encode("utf-8"), digest_size=16).digest()
+            pdf_bytes = pdf_cache.lookup(cache_key)
+            if pdf_bytes is None:
+                async with _render_semaphore:
+                    pdf_bytes = await run_render(final_html)
+                pdf_cache.store(cache_key, pdf_bytes)
+
+            timestamp = filename_timestamp(int(time.time()))
+            filename = f"KHMER_PDF_{timestamp}.pdf"
+
+            await context.bot.send_document(
+                chat_id=update.effective_chat.id,
+                document=pdf_bytes,
+                filename=filename,
+                caption=DONE_CAPTION
+            )
+
+        except Exception as e:
+            logger.exception("Error creating PDF for user %s", user_id)
+            # ដាក់អត្ថបទត្រឡប់វិញ (បូកនឹងសារដែលមកក្រោយ) ដើម្បីអាច /done ម្តងទៀត
+            current = user_data_store.get(user_id)
+            if current is None:
+                user_data_store[user_id] = current = UserSession()
+            dropped = False
+            if current.buffer.tell():
+                # កុំឱ្យលើស MAX_TEXT_CHARS: បើលើស ទុកតែអត្ថបទចាស់ ហើយបោះសារថ្មីចោល
+                if buffer.tell() + len("<br>\n") + current.buffer.tell() <= MAX_TEXT_CHARS:
+                    buffer.write("<br>\n")
+                    buffer.write(current.buffer.getvalue())
+                else:
+                    dropped = True
+                    current.unacked = 0  # កុំឆ្លើយ "បានរក្សាទុក" សម្រាប់សារដែលបោះចោល
+            current.buffer = buffer
+            user_data_store.touch(user_id)
+            await update.message.reply_text(ERROR_MESSAGE.format(error=e))
+            if dropped:
+                await update.message.reply_text(DROPPED_MESSAGE)
+
+async def evict_idle_sessions(context: ContextTypes.DEFAULT_TYPE) -> None:
+    evicted = user_data_store.evict_idle(SESSION_IDLE_SECONDS)
+    if evicted:
+        logger.info("Evicted %d idle user sessions", evicted)
 
 # <--- ការកែប្រែទី៣៖ បន្ថែម Error Handler ដើម្បីការពារ Bot ពីការគាំង (crash)
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -167,7 +468,23 @@ app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, receive_text))
 # បន្ថែម Error handler ទៅក្នុង Application
 app.add_error_handler(error_handler)
 
+# លុប session ដែលបោះបង់ចោល (ត្រូវការ python-telegram-bot[job-queue])
+if app.job_queue is not None:
+    app.job_queue.run_repeating(
+        evict_idle_sessions, interval=SESSION_SWEEP_SECONDS, first=SESSION_SWEEP_SECONDS
+    )
+
 if __name__ == "__main__":
+    if uvloop is not None:
+        uvloop.install()
     logger.info("🚀 Bot is running with Highlight, Timeout, and Error Handling support...")
-    # Polling ជាមួយ Timeout ដែលបានកំណត់
-    app.run_polling()
+    if WEBHOOK_URL:
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            url_path=TOKEN,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{TOKEN}",
+        )
+    else:
+        # Long polling 30s (getUpdates) — តភ្ជាប់ឡើងវិញតិចជាង ហើយ retry ជានិច្ចពេលចាប់ផ្តើម
+        app.run_polling(timeout=30, bootstrap_retries=-1)